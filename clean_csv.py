@@ -6,16 +6,131 @@ Supports optional 'type' column for route types (car/flight).
 """
 
 import pandas as pd
+import numpy as np
+import csv
 import sys
 from pathlib import Path
 
 
-def clean_trip_csv(input_file, output_file=None, date_column='date', place_column='place', type_column='type'):
+# Place names are stored Arrow-backed when PyArrow is available (compact, fast .str ops)
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = 'string[pyarrow]'
+except ImportError:
+    STRING_DTYPE = 'string'
+
+
+def read_trip_csv(input_file, fast_io=False, date_column=None, dtype=None, usecols=None):
+    """
+    Read a trip CSV into a DataFrame.
+    ISO 8601 dates in date_column are parsed while reading and dtype (column -> dtype) is
+    applied up front. If usecols is given, only those columns are read.
+    Columns missing from the file are ignored for all three.
+    With fast_io, parse using PyArrow's multi-threaded CSV reader and keep the
+    columns Arrow-backed; falls back to pandas' default reader if PyArrow is missing.
+    """
+    columns = pd.read_csv(input_file, nrows=0).columns
+    if usecols is not None:
+        usecols = [column for column in columns if column in usecols]
+    dtype = {column: kind for column, kind in (dtype or {}).items() if column in columns}
+    
+    if fast_io:
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+        except ImportError:
+            print("  Note: pyarrow not installed, using the default CSV reader")
+        else:
+            # Columns with a requested dtype are read as text, so Arrow never infers them
+            # as null (an empty column) or as numbers (ZIP codes would lose leading zeros);
+            # empty fields stay missing, as with the default reader
+            table = pacsv.read_csv(
+                input_file,
+                read_options=pacsv.ReadOptions(use_threads=True),
+                parse_options=pacsv.ParseOptions(delimiter=','),
+                convert_options=pacsv.ConvertOptions(include_columns=usecols,
+                                                     column_types={column: pa.string() for column in dtype},
+                                                     strings_can_be_null=True)
+            )
+            df = table.to_pandas(types_mapper=pd.ArrowDtype)
+            return df.astype({column: kind for column, kind in dtype.items() if column in df.columns})
+    
+    parse_dates = [date_column] if date_column in columns else None
+    return pd.read_csv(input_file, usecols=usecols, dtype=dtype, parse_dates=parse_dates, date_format='ISO8601')
+
+
+def parse_trip_dates(dates):
+    """
+    Parse a column of dates, trying the ISO 8601 fast path first.
+    Only values that do not match fall back to per-value format inference
+    (format='mixed'), which raises on dates that cannot be parsed at all.
+    """
+    parsed = pd.to_datetime(dates, format='ISO8601', errors='coerce', cache=True)
+    retry = parsed.isna() & dates.notna()
+    if retry.any():
+        parsed = parsed.astype('datetime64[us]')
+        parsed[retry] = pd.to_datetime(dates[retry], format='mixed', cache=True)
+    return parsed
+
+
+def write_trip_csv(df, output_file, fast_io=False):
+    """
+    Write a cleaned trip DataFrame to CSV.
+    By default, fields are quoted only when they contain a comma, quote or newline
+    (QUOTE_MINIMAL). With fast_io, use PyArrow's CSV writer instead: its 'needed'
+    quoting style still quotes every string field and the header, so the file is
+    quoted differently but reads back the same. Falls back to the default writer
+    if PyArrow is missing.
+    """
+    if fast_io:
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+        except ImportError:
+            print("  Note: pyarrow not installed, using the default CSV writer")
+        else:
+            pacsv.write_csv(
+                pa.Table.from_pandas(df, preserve_index=False),
+                output_file,
+                write_options=pacsv.WriteOptions(include_header=True, quoting_style='needed')
+            )
+            return
+    
+    if all(pd.api.types.is_string_dtype(df[column]) or isinstance(df[column].dtype, pd.CategoricalDtype)
+           for column in df.columns):
+        _write_text_csv(df, output_file)
+    else:
+        df.to_csv(output_file, index=False, quoting=csv.QUOTE_MINIMAL)
+
+
+def _write_text_csv(df, output_file):
+    """
+    Fast path for frames of text columns: quote fields column-wise with vectorized
+    string ops, then write joined rows through a large buffer (QUOTE_MINIMAL rules).
+    """
+    columns = []
+    for column in df.columns:
+        values = df[column].astype(object).fillna('').astype(str)
+        needs_quotes = values.str.contains(r'[,"\r\n]', regex=True)
+        if needs_quotes.any():
+            values = values.where(~needs_quotes, '"' + values.str.replace('"', '""', regex=False) + '"')
+        columns.append(values.tolist())
+    
+    header = ','.join('"' + name.replace('"', '""') + '"' if any(c in name for c in ',"\r\n') else name
+                      for name in map(str, df.columns))
+    with open(output_file, 'w', encoding='utf-8', newline='', buffering=1 << 20) as f:
+        f.write(header + '\n')
+        f.writelines(','.join(row) + '\n' for row in zip(*columns))
+
+
+def clean_trip_csv(input_file, output_file=None, date_column='date', place_column='place', type_column='type',
+                   fast_io=False):
     """
     Clean and validate trip CSV file.
     - Validates date format
     - Ensures proper quoting for place names with commas
     - Sorts by date
+    Pass fast_io=True to read and write the CSV with PyArrow.
     """
     
     # Determine output filename
@@ -27,7 +142,8 @@ def clean_trip_csv(input_file, output_file=None, date_column='date', place_colum
     
     try:
         # Read CSV with proper handling of quoted fields
-        df = pd.read_csv(input_file)
+        df = read_trip_csv(input_file, fast_io, date_column=date_column,
+                           dtype={place_column: STRING_DTYPE, type_column: 'category'})
     except Exception as e:
         print(f"✗ Error reading CSV: {e}")
         sys.exit(1)
@@ -49,10 +165,12 @@ def clean_trip_csv(input_file, output_file=None, date_column='date', place_colum
     
     # Validate and parse dates
     print(f"\nValidating dates in '{date_column}' column...")
-    original_dates = df[date_column].copy()
+    raw_dates = df[date_column]  # kept for reporting; parsing assigns a new column, so no copy
     
     try:
-        df[date_column] = pd.to_datetime(df[date_column], format='mixed')
+        # ISO dates are parsed by the CSV reader; parse here if it could not
+        if not pd.api.types.is_datetime64_any_dtype(df[date_column]):
+            df[date_column] = parse_trip_dates(df[date_column])
         valid_dates = df[date_column].notna()
         
         if valid_dates.all():
@@ -60,47 +178,38 @@ def clean_trip_csv(input_file, output_file=None, date_column='date', place_colum
         else:
             invalid_count = (~valid_dates).sum()
             print(f"  ⚠ Warning: {invalid_count} invalid date(s) found:")
-            for idx in df[~valid_dates].index:
-                print(f"    Row {idx + 2}: '{original_dates[idx]}'")
-            
-            # Remove invalid dates
-            df = df[valid_dates].reset_index(drop=True)
-            print(f"  Keeping {len(df)} rows with valid dates")
+            for idx in np.flatnonzero(~valid_dates.to_numpy()):
+                print(f"    Row {idx + 2}: '{raw_dates.iloc[idx]}'")
+            print(f"  Keeping {valid_dates.sum()} rows with valid dates")
     
     except Exception as e:
         print(f"✗ Error parsing dates: {e}")
         sys.exit(1)
     
-    # Sort by date
-    df = df.sort_values(by=date_column).reset_index(drop=True)
-    print(f"  ✓ Sorted by date")
-    
-    # Format dates consistently
-    df[date_column] = df[date_column].dt.strftime('%Y-%m-%d')
-    
-    # Check place names
+    # Check place names (of the rows with valid dates), stripping whitespace once up front
     print(f"\nValidating places in '{place_column}' column...")
-    empty_places = df[place_column].isna() | (df[place_column].str.strip() == '')
+    df[place_column] = df[place_column].str.strip()
+    empty_places = (df[place_column].isna() | (df[place_column].str.len() == 0)) & valid_dates
     
     if empty_places.any():
         print(f"  ⚠ Warning: {empty_places.sum()} empty place(s) found:")
-        for idx in df[empty_places].index:
-            print(f"    Row {idx + 2}: date={df.loc[idx, date_column]}")
-        df = df[~empty_places].reset_index(drop=True)
-        print(f"  Keeping {len(df)} rows with valid places")
+        for idx in np.flatnonzero(empty_places.to_numpy()):
+            print(f"    Row {idx + 2}: date={df[date_column].iloc[idx]:%Y-%m-%d}")
+        print(f"  Keeping {(valid_dates & ~empty_places).sum()} rows with valid places")
     else:
-        print(f"  ✓ All {len(df)} places are valid")
+        print(f"  ✓ All {valid_dates.sum()} places are valid")
     
-    # Strip whitespace from places
-    df[place_column] = df[place_column].str.strip()
+    # Drop invalid rows and sort by date in one pass
+    df = df.loc[valid_dates & ~empty_places].sort_values(by=date_column, ignore_index=True)
+    print(f"  ✓ Sorted by date")
+    
+    # Format dates consistently
+    df[date_column] = df[date_column].dt.strftime('%Y-%m-%d')
     
     # Validate and clean type column if present
     if has_type_column:
         print(f"\nValidating types in '{type_column}' column...")
         
-        # Standardize type values
-        df[type_column] = df[type_column].fillna('flight').str.lower().str.strip()
-        
         # Map variations to standard values
         type_mapping = {
             'car': 'car',
@@ -112,7 +221,10 @@ def clean_trip_csv(input_file, output_file=None, date_column='date', place_colum
             'plane': 'flight'
         }
         
-        df[type_column] = df[type_column].map(lambda x: type_mapping.get(x, 'flight'))
+        # Standardize the few distinct values rather than every row; missing types become flights
+        types = df[type_column].astype('category')
+        standard = types.cat.categories.astype(str).str.lower().str.strip().map(type_mapping).fillna('flight')
+        df[type_column] = pd.Categorical(np.append(standard.to_numpy(dtype=object), 'flight')[types.cat.codes])
         
         # Count types
         type_counts = df[type_column].value_counts()
@@ -123,7 +235,7 @@ def clean_trip_csv(input_file, output_file=None, date_column='date', place_colum
     
     # Save with proper quoting (quotes fields with commas automatically)
     print(f"\nWriting cleaned CSV to: {output_file}")
-    df.to_csv(output_file, index=False, quoting=1)  # quoting=1 means QUOTE_ALL
+    write_trip_csv(df, output_file, fast_io)
     
     print(f"✓ Done! Cleaned {len(df)} rows")
     print(f"\nSummary:")
@@ -134,8 +246,11 @@ def clean_trip_csv(input_file, output_file=None, date_column='date', place_colum
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python clean_csv.py <input_csv> [output_csv]")
+    fast_io = '--fast-io' in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != '--fast-io']
+    
+    if len(args) < 1:
+        print("Usage: python clean_csv.py [--fast-io] <input_csv> [output_csv]")
         print("\nCleans and validates trip CSV files:")
         print("  - Validates date format")
         print("  - Ensures proper quoting for place names")
@@ -149,9 +264,10 @@ if __name__ == "__main__":
         print("\nExamples:")
         print("  python clean_csv.py 2025_trip.csv")
         print("  python clean_csv.py 2025_trip.csv 2025_trip_clean.csv")
+        print("  python clean_csv.py --fast-io 2025_trip.csv  (read/write with PyArrow, if installed)")
         sys.exit(1)
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else None
+    input_file = args[0]
+    output_file = args[1] if len(args) > 1 else None
     
-    clean_trip_csv(input_file, output_file)
+    clean_trip_csv(input_file, output_file, fast_io=fast_io)
@@ -7,70 +7,511 @@ Supports both flight (straight line) and car (road routing) connections.
 """
 
 import pandas as pd
-import folium
-from geopy.geocoders import Nominatim
+import numpy as np
+from geopy.geocoders import Nominatim, Photon, ArcGIS
 from geopy.extra.rate_limiter import RateLimiter
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import functools
+import math
+import shelve
+import sqlite3
+import time
 import sys
 import os
 from datetime import datetime
 import requests
-import time
-import polyline
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+try:
+    import orjson
+except ImportError:  # optional: speeds up parsing routing responses and serializing animation data
+    orjson = None
 import argparse
 import json
 
+from clean_csv import read_trip_csv, parse_trip_dates, STRING_DTYPE
 
-def geocode_places(df, place_column='place'):
-    """Convert place names to coordinates using geopy."""
-    geolocator = Nominatim(
-        user_agent="tripmap_visualizer",
-        timeout=10
-    )
-    geocode = RateLimiter(
-        geolocator.geocode,
-        min_delay_seconds=1.5,
-        max_retries=3,
-        error_wait_seconds=2.0
-    )
-    
-    coords = []
-    locations_found = []
-    for idx, place in enumerate(df[place_column], 1):
-        print(f"[{idx}/{len(df)}] Geocoding: {place}...", end=" ")
+
+GEOCODE_CACHE_FILE = 'geocode_cache.sqlite'
+# Geocoding results are committed to the cache file after this many new places
+GEOCODE_COMMIT_EVERY = 10
+ROUTE_CACHE_FILE = 'route_cache.db'
+GEOCODE_MAX_WORKERS = 8
+# Requests kept in flight when geocoding against a self-hosted Nominatim server
+GEOCODE_ASYNC_CONCURRENCY = 10
+ROUTING_MAX_WORKERS = 8
+# Route endpoints are rounded to this many decimals (about 11 m) for caching
+ROUTE_CACHE_DECIMALS = 4
+# Upper bound on the legs routed by one multi-waypoint OSRM request
+OSRM_MAX_LEGS_PER_REQUEST = 24
+# Leg types (case-insensitive) that are routed by road; everything else is a flight
+CAR_TYPES = frozenset({'car', 'drive', 'driving'})
+# Car legs shorter than this are drawn as a straight line without a routing request
+MIN_ROUTE_DISTANCE_KM = 1.0
+# Animated route paths are simplified to within this many degrees (about 50 m)
+ROUTE_SIMPLIFY_TOLERANCE_DEG = 0.0005
+
+# Above this many stops, create_trip_map draws them as one GeoJSON layer instead of pins
+GEOJSON_MARKER_THRESHOLD = 200
+
+# Numbered map pins for create_trip_map, coloured like folium's default marker icons
+PIN_CSS = """
+<style>
+    .trip-pin {
+        width: 26px;
+        height: 26px;
+        border-radius: 50% 50% 50% 0;
+        transform: rotate(-45deg);
+        border: 2px solid white;
+        box-sizing: border-box;
+        box-shadow: 0 1px 4px rgba(0,0,0,0.5);
+        display: flex;
+        align-items: center;
+        justify-content: center;
+    }
+    .trip-pin span {
+        transform: rotate(45deg);
+        font-size: 10pt;
+        font-weight: bold;
+        color: white;
+    }
+    .trip-pin-red { background: #d63e2a; }
+    .trip-pin-green { background: #72b026; }
+    .trip-pin-blue { background: #38aadd; }
+</style>
+"""
+PIN_COLORS = {'red': '#d63e2a', 'green': '#72b026', 'blue': '#38aadd'}
+
+# Shared across routing threads so connections are reused (HTTP keep-alive);
+# the pool is sized to cover every routing worker. Rate-limit and gateway errors
+# are retried with short exponential backoff (0.5 s, 1 s, 2 s) before a leg falls back
+# to a straight line. Retry-After is ignored: retries sleep while holding an OSRM slot,
+# so a long server-requested wait would stall every routing worker
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.5, backoff_max=2.0, status_forcelist=[429, 502, 503, 504],
+                      respect_retry_after_header=False)
+)
+_session.mount('https://', _adapter)
+_session.mount('http://', _adapter)
+# OSRM's public demo server only tolerates a couple of concurrent requests per client,
+# started at most about once a second; cache hits never reach it, so they never wait
+_osrm_slots = threading.Semaphore(2)
+_osrm_get = RateLimiter(_session.get, min_delay_seconds=1.0, max_retries=0, swallow_exceptions=False)
+# shelve is not safe for concurrent access from the routing threads
+_route_cache_lock = threading.Lock()
+
+
+def _normalize_place(place):
+    """Normalize a place name into a cache key (case and whitespace insensitive)."""
+    if not isinstance(place, str):
+        return None
+    return ' '.join(place.lower().split()) or None
+
+
+def _open_geocode_cache(cache_file=GEOCODE_CACHE_FILE):
+    """Open the SQLite geocode cache, creating it if needed (in memory if cache_file is None)."""
+    try:
+        conn = sqlite3.connect(cache_file or ':memory:')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS places '
+            '(query TEXT PRIMARY KEY, lat REAL, lon REAL, address TEXT, ts INTEGER)'
+        )
+    except sqlite3.Error as e:
+        print(f"  Note: Could not open geocode cache '{cache_file}' ({e}), not caching this run")
+        conn = sqlite3.connect(':memory:')
+        conn.execute(
+            'CREATE TABLE places (query TEXT PRIMARY KEY, lat REAL, lon REAL, address TEXT, ts INTEGER)'
+        )
+    return conn
+
+
+def _load_geocode_cache(conn, keys):
+    """Return {key: {'latitude', 'longitude', 'address'}} for the keys already cached."""
+    cache = {}
+    for key in keys:
+        row = conn.execute('SELECT lat, lon, address FROM places WHERE query = ?', (key,)).fetchone()
+        if row:
+            cache[key] = {'latitude': row[0], 'longitude': row[1], 'address': row[2]}
+    return cache
+
+
+def _split_nominatim_domain(nominatim_domain):
+    """Split 'host[:port]' or 'scheme://host[:port]' into (scheme, domain), defaulting to https."""
+    scheme, _, domain = nominatim_domain.rpartition('://')
+    return scheme or 'https', domain
+
+
+def _build_geocoders(nominatim_domain=None):
+    """
+    Build one rate-limited geocode callable per backend, in priority order,
+    as (geocode, storable) pairs.
+    Each backend gets its own RateLimiter so its usage policy is honoured
+    independently (Nominatim's public server allows at most 1 request/second).
+    ArcGIS results are not storable: Esri's terms forbid keeping results of
+    requests made without forStorage=true, so they are used for this run only.
+    With nominatim_domain, only that (self-hosted) Nominatim server is used, without spacing.
+    """
+    if nominatim_domain:
+        scheme, domain = _split_nominatim_domain(nominatim_domain)
+        backends = [(Nominatim(domain=domain, scheme=scheme, user_agent="tripmap_visualizer", timeout=10), 0, True)]
+    else:
+        backends = [
+            (Nominatim(user_agent="tripmap_visualizer", timeout=10), 1.5, True),
+            (Photon(user_agent="tripmap_visualizer", timeout=10), 1.0, True),
+            (ArcGIS(user_agent="tripmap_visualizer", timeout=10), 1.0, False),
+        ]
+    return [
+        (
+            RateLimiter(
+                geolocator.geocode,
+                min_delay_seconds=min_delay,
+                max_retries=3,
+                error_wait_seconds=2.0
+            ),
+            storable
+        )
+        for geolocator, min_delay, storable in backends
+    ]
+
+
+def _geocode_one(geocoders, place, first=0):
+    """
+    Geocode a single place, starting with backend number first and falling back
+    to the others, in order, until one finds it.
+    Returns (location, error name, storable).
+    """
+    error = None
+    for geocode, storable in geocoders[first:] + geocoders[:first]:
         try:
             location = geocode(place)
-            if location:
-                coords.append((location.latitude, location.longitude))
-                locations_found.append(location.address)
-                print(f"✓ ({location.latitude:.4f}, {location.longitude:.4f})")
-                # Show the interpreted address for verification
-                if location.address:
-                    # Extract country/region for quick verification
-                    address_parts = location.address.split(', ')
-                    if len(address_parts) >= 2:
-                        region_info = ', '.join(address_parts[-2:])
-                        print(f"      → Found: {region_info}")
-            else:
-                coords.append((None, None))
-                locations_found.append(None)
-                print(f"✗ Not found")
         except Exception as e:
-            coords.append((None, None))
-            locations_found.append(None)
-            print(f"✗ Error: {type(e).__name__}")
+            error = type(e).__name__
+            continue
+        if location:
+            return location, None, storable
+    return None, error, False
+
+
+def _print_geocode_result(idx, total, place, location, error):
+    """Print one place's geocoding result (a cache entry dict, or None with an optional error name)."""
+    print(f"[{idx}/{total}] Geocoding: {place}...", end=" ")
+    if location:
+        print(f"✓ ({location['latitude']:.4f}, {location['longitude']:.4f})")
+        # Show the interpreted address for verification
+        if location['address']:
+            # Extract country/region for quick verification
+            address_parts = location['address'].split(', ')
+            if len(address_parts) >= 2:
+                region_info = ', '.join(address_parts[-2:])
+                print(f"      → Found: {region_info}")
+    elif error:
+        print(f"✗ Error: {error}")
+    else:
+        print("✗ Not found")
+
+
+def _aiohttp_available():
+    """Whether geopy's aiohttp adapter can be used (aiohttp is an optional dependency)."""
+    from geopy.adapters import AioHTTPAdapter
+    return AioHTTPAdapter.is_available
+
+
+async def _geocode_async(places, nominatim_domain, on_result, concurrency=GEOCODE_ASYNC_CONCURRENCY):
+    """
+    Geocode places against a self-hosted Nominatim server with aiohttp, keeping up to
+    concurrency requests in flight. Calls on_result(place, (location, error name, storable))
+    for each place as soon as its lookup finishes.
+    """
+    from geopy.adapters import AioHTTPAdapter
+    from geopy.extra.rate_limiter import AsyncRateLimiter
     
-    df['latitude'] = [c[0] for c in coords]
-    df['longitude'] = [c[1] for c in coords]
-    df['geocoded_address'] = locations_found
+    scheme, domain = _split_nominatim_domain(nominatim_domain)
+    async with Nominatim(domain=domain, scheme=scheme, user_agent="tripmap_visualizer",
+                         timeout=10, adapter_factory=AioHTTPAdapter) as geolocator:
+        geocode = AsyncRateLimiter(geolocator.geocode, min_delay_seconds=0, max_retries=3, error_wait_seconds=2.0)
+        slots = asyncio.Semaphore(concurrency)
+        
+        async def lookup(place):
+            async with slots:
+                try:
+                    return place, (await geocode(place), None, True)
+                except Exception as e:
+                    return place, (None, type(e).__name__, False)
+        
+        for finished in asyncio.as_completed([lookup(place) for place in places]):
+            on_result(*await finished)
+
+
+def geocode_places(df, place_column='place', cache_file=GEOCODE_CACHE_FILE, nominatim_domain=None):
+    """
+    Convert place names to coordinates using geopy.
+    Unique uncached places are looked up concurrently by a bounded thread pool,
+    spread round-robin across several rate-limited geocoding backends, with the other
+    backends tried when the first one finds nothing. Results are cached
+    in the SQLite file cache_file as they arrive (ArcGIS results only for the current run),
+    so repeated places cost no network calls, within a run or across runs (even if a run is interrupted).
+    With nominatim_domain (a self-hosted Nominatim server, which has no public usage
+    policy to honour), only that server is queried, with asyncio and many places at a
+    time when aiohttp is installed.
+    """
+    # Normalize each distinct spelling once; every uncached place is then looked
+    # up once, using its first spelling in the CSV
+    keys = {place: _normalize_place(place) for place in df[place_column].drop_duplicates()}
+    conn = _open_geocode_cache(cache_file)
+    cache = _load_geocode_cache(conn, {key for key in keys.values() if key})
+    pending = {}
+    for place, key in keys.items():
+        if key and key not in cache and key not in pending:
+            pending[key] = place
+    
+    errors = {}
+    # Places whose result has been printed; new lookups are reported live, as they finish
+    reported = set()
+    if pending:
+        queries = list(pending.values())
+        
+        new_results = 0
+        
+        def record(place, result):
+            """
+            Report and store one (location, error, storable) result as it arrives,
+            committing every few places.
+            """
+            nonlocal new_results
+            location, error, storable = result
+            key = _normalize_place(place)
+            reported.add(place)
+            if not location:
+                if error:
+                    errors[key] = error
+                _print_geocode_result(len(reported), len(keys), place, None, error)
+                return
+            cache[key] = {
+                'latitude': location.latitude,
+                'longitude': location.longitude,
+                'address': location.address
+            }
+            _print_geocode_result(len(reported), len(keys), place, cache[key], None)
+            if not storable:
+                return
+            conn.execute(
+                'INSERT OR REPLACE INTO places VALUES (?, ?, ?, ?, ?)',
+                (key, location.latitude, location.longitude, location.address, int(time.time()))
+            )
+            new_results += 1
+            if new_results % GEOCODE_COMMIT_EVERY == 0:
+                conn.commit()
+        
+        try:
+            if nominatim_domain and _aiohttp_available():
+                print(f"Geocoding {len(queries)} new place(s) using {nominatim_domain}, "
+                      f"{GEOCODE_ASYNC_CONCURRENCY} at a time ({len(cache)} cached)...")
+                asyncio.run(_geocode_async(queries, nominatim_domain, record))
+            else:
+                # A configured server is the only backend used, even without aiohttp,
+                # so the itinerary is never sent to the public services
+                geocoders = _build_geocoders(nominatim_domain)
+                if nominatim_domain:
+                    print(f"Geocoding {len(queries)} new place(s) using {nominatim_domain} "
+                          f"({len(cache)} cached; install aiohttp for faster lookups)...")
+                else:
+                    print(f"Geocoding {len(queries)} new place(s) using {len(geocoders)} backends "
+                          f"({len(cache)} cached)...")
+                
+                # Places start on the backends round-robin, so their rate limits apply in
+                # parallel, and fall back to the other backends on a miss; each backend's
+                # RateLimiter is thread-safe, so several requests can be in flight while its spacing holds
+                def lookup(i):
+                    return _geocode_one(geocoders, queries[i], i % len(geocoders))
+                
+                with ThreadPoolExecutor(max_workers=GEOCODE_MAX_WORKERS) as executor:
+                    for place, result in zip(queries, executor.map(lookup, range(len(queries)))):
+                        record(place, result)
+        finally:
+            # Keep everything found so far, even if the run is interrupted
+            conn.commit()
+    conn.close()
+    
+    # Resolve each distinct place once (reporting those that were not looked up just now),
+    # then map the results back onto every row
+    lats = {}
+    lons = {}
+    addresses = {}
+    for place, key in keys.items():
+        location = cache.get(key)
+        if place not in reported:
+            reported.add(place)
+            _print_geocode_result(len(reported), len(keys), place, location, errors.get(key))
+        if location:
+            lats[place] = location['latitude']
+            lons[place] = location['longitude']
+            addresses[place] = location['address']
+    
+    # Missing coordinates stay NaN, so both columns are plain float64
+    places = df[place_column].astype(object)
+    df['latitude'] = places.map(lats).to_numpy(dtype=np.float64, na_value=np.nan)
+    df['longitude'] = places.map(lons).to_numpy(dtype=np.float64, na_value=np.nan)
+    df['geocoded_address'] = places.map(addresses)
     return df
 
 
+def _decode_polyline_arrays(data):
+    """Decode polyline bytes (precision 5) into separate latitude and longitude arrays."""
+    # Every point takes at least two bytes, so len(data) bounds the point count
+    lats = np.empty(len(data), dtype=np.float64)
+    lons = np.empty(len(data), dtype=np.float64)
+    index = 0
+    count = 0
+    lat = 0
+    lon = 0
+    while index < len(data):
+        for axis in range(2):
+            result = 0
+            shift = 0
+            while True:
+                if index >= len(data):
+                    raise ValueError('truncated polyline')
+                byte = np.int64(data[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            change = ~(result >> 1) if result & 1 else result >> 1
+            if axis == 0:
+                lat += change
+            else:
+                lon += change
+        lats[count] = lat / 100000.0
+        lons[count] = lon / 100000.0
+        count += 1
+    return lats[:count], lons[:count]
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled_polyline_decoder():
+    """Compile _decode_polyline_arrays with Numba on first use; None if numba is not installed."""
+    try:
+        from numba import njit
+    except ImportError:  # optional: speeds up decoding of long route polylines
+        return None
+    return njit(cache=True)(_decode_polyline_arrays)
+
+
+def decode_polyline(encoded):
+    """
+    Decode an encoded polyline into a list of (lat, lon) tuples.
+    Uses a Numba-compiled decoder when numba is installed, else the polyline package.
+    """
+    decoder = _compiled_polyline_decoder()
+    if decoder is None:
+        import polyline
+        return polyline.decode(encoded)
+    lats, lons = decoder(np.frombuffer(encoded.encode('ascii'), dtype=np.uint8))
+    return list(zip(lats.tolist(), lons.tolist()))
+
+
 def get_driving_route(start_coords, end_coords, google_api_key=None):
     """
     Get driving route between two points using Google Maps Directions API.
     Falls back to OSRM if Google API key is not provided.
     Returns list of coordinate points along the route.
+    Routes are cached per provider and endpoint pair (rounded to ROUTE_CACHE_DECIMALS),
+    in memory and in ROUTE_CACHE_FILE, so re-rendering a trip skips the network.
     """
+    return _cached_driving_route(
+        round(float(start_coords[0]), ROUTE_CACHE_DECIMALS), round(float(start_coords[1]), ROUTE_CACHE_DECIMALS),
+        round(float(end_coords[0]), ROUTE_CACHE_DECIMALS), round(float(end_coords[1]), ROUTE_CACHE_DECIMALS),
+        google_api_key
+    )
+
+
+def get_driving_route_legs(waypoints):
+    """
+    Get OSRM driving routes for each consecutive pair of waypoints with one request.
+    Returns a list holding the route coordinates (or None) of every leg. Legs share
+    the route cache with get_driving_route; if the batched request fails, each leg
+    is requested on its own.
+    """
+    pairs = list(zip(waypoints, waypoints[1:]))
+    if len(pairs) == 1:
+        return [get_driving_route(*pairs[0])]
+    
+    keys = [_route_cache_key(start, end, None) for start, end in pairs]
+    cached = _read_route_cache(keys)
+    if len(cached) == len(keys):
+        return [cached[key] for key in keys]
+    
+    legs = _request_osrm_legs(waypoints)
+    if legs is None:
+        return [get_driving_route(start, end) for start, end in pairs]
+    _write_route_cache({key: leg for key, leg in zip(keys, legs) if leg})
+    return legs
+
+
+def _route_cache_key(start_coords, end_coords, google_api_key):
+    """Route cache key: the provider plus both endpoints rounded to ROUTE_CACHE_DECIMALS."""
+    provider = 'google' if google_api_key else 'osrm'
+    start_lat, start_lon, end_lat, end_lon = (
+        round(float(value), ROUTE_CACHE_DECIMALS) for value in (*start_coords[:2], *end_coords[:2])
+    )
+    return f"{provider}:{start_lat},{start_lon};{end_lat},{end_lon}"
+
+
+def _read_route_cache(keys):
+    """Return {key: route coords} for the keys present in the on-disk route cache."""
+    routes = {}
+    try:
+        with _route_cache_lock, shelve.open(ROUTE_CACHE_FILE) as cache:
+            for key in keys:
+                if key not in cache:
+                    continue
+                # Routes are stored as encoded polylines; an entry that cannot be read or
+                # decoded is treated as a miss, so the route is fetched again and overwritten
+                try:
+                    routes[key] = decode_polyline(cache[key])
+                except Exception:
+                    continue
+    except Exception as e:
+        print(f"    ⚠ Route cache unavailable: {type(e).__name__}")
+        return {}
+    return routes
+
+
+def _write_route_cache(routes):
+    """Store {key: route coords} in the on-disk route cache, as compact encoded polylines."""
+    if not routes:
+        return
+    import polyline
+    encoded = {key: polyline.encode(route_coords) for key, route_coords in routes.items()}
+    try:
+        with _route_cache_lock, shelve.open(ROUTE_CACHE_FILE) as cache:
+            cache.update(encoded)
+    except Exception as e:
+        print(f"    ⚠ Could not cache route: {type(e).__name__}")
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_driving_route(start_lat, start_lon, end_lat, end_lon, google_api_key):
+    """Look up a route in the on-disk cache, requesting and storing it on a miss."""
+    key = _route_cache_key((start_lat, start_lon), (end_lat, end_lon), google_api_key)
+    cached = _read_route_cache([key])
+    if key in cached:
+        return cached[key]
+    
+    route_coords = _request_driving_route((start_lat, start_lon), (end_lat, end_lon), google_api_key)
+    if route_coords:
+        _write_route_cache({key: route_coords})
+    return route_coords
+
+
+def _request_driving_route(start_coords, end_coords, google_api_key=None):
+    """Request a driving route from Google Maps (if a key is given) or OSRM."""
     if google_api_key:
         # Use Google Maps Directions API
         try:
@@ -81,13 +522,13 @@ def get_driving_route(start_coords, end_coords, google_api_key=None):
                 'mode': 'driving',
                 'key': google_api_key
             }
-            response = requests.get(url, params=params, timeout=10)
-            data = response.json()
+            response = _session.get(url, params=params, timeout=10)
+            data = _loads_json(response.content)
             
             if data['status'] == 'OK':
                 # Decode polyline from Google's encoded format
                 encoded_polyline = data['routes'][0]['overview_polyline']['points']
-                route_coords = polyline.decode(encoded_polyline)
+                route_coords = decode_polyline(encoded_polyline)
                 return route_coords
             else:
                 print(f"    ⚠ Google routing failed: {data['status']}, using straight line")
@@ -103,13 +544,14 @@ def get_driving_route(start_coords, end_coords, google_api_key=None):
                 'overview': 'full',
                 'geometries': 'polyline'
             }
-            response = requests.get(url, params=params, timeout=10)
-            data = response.json()
+            with _osrm_slots:
+                response = _osrm_get(url, params=params, timeout=10)
+            data = _loads_json(response.content)
             
             if data['code'] == 'Ok':
                 # Decode polyline from OSRM
                 encoded_polyline = data['routes'][0]['geometry']
-                route_coords = polyline.decode(encoded_polyline)
+                route_coords = decode_polyline(encoded_polyline)
                 return route_coords
             else:
                 print(f"    ⚠ OSRM routing failed, using straight line")
@@ -119,47 +561,258 @@ def get_driving_route(start_coords, end_coords, google_api_key=None):
             return None
 
 
-def create_animated_trip_map(csv_file, output_file='trip_map_animated.html', date_column='date', place_column='place', type_column='type'):
-    """Create an animated map with a single moving marker traveling along routes (AllTrails style)."""
+def _request_osrm_legs(waypoints):
+    """
+    Request one OSRM route through all waypoints and split it into legs.
+    Returns a list of coordinate lists, one per leg, or None if routing failed.
+    """
+    coordinates = ';'.join(f"{lon},{lat}" for lat, lon in waypoints)
+    url = f"http://router.project-osrm.org/route/v1/driving/{coordinates}"
+    params = {
+        'overview': 'false',
+        'steps': 'true',
+        'geometries': 'polyline'
+    }
+    try:
+        with _osrm_slots:
+            response = _osrm_get(url, params=params, timeout=30)
+        data = _loads_json(response.content)
+        
+        if data['code'] != 'Ok':
+            print(f"    ⚠ OSRM routing failed for {len(waypoints) - 1} legs, retrying them one by one")
+            return None
+        
+        # Each leg's path is the concatenation of its steps, which share their joining points
+        legs = []
+        for leg in data['routes'][0]['legs']:
+            leg_coords = []
+            for step in leg['steps']:
+                for point in decode_polyline(step['geometry']):
+                    if not leg_coords or point != leg_coords[-1]:
+                        leg_coords.append(point)
+            legs.append(leg_coords or None)
+        return legs
+    except Exception as e:
+        print(f"    ⚠ OSRM routing error: {type(e).__name__}, retrying {len(waypoints) - 1} legs one by one")
+        return None
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+def simplify_path(path_coords, tolerance_deg=ROUTE_SIMPLIFY_TOLERANCE_DEG):
+    """
+    Simplify a [(lat, lon), ...] path with Ramer-Douglas-Peucker, keeping both endpoints.
+    Uses shapely (GEOS) when installed, else a NumPy implementation of the same algorithm.
+    """
+    if len(path_coords) < 3:
+        return path_coords
+    try:
+        from shapely.geometry import LineString
+    except ImportError:  # optional: GEOS-backed simplification of long route paths
+        pass
+    else:
+        return list(LineString(path_coords).simplify(tolerance_deg, preserve_topology=False).coords)
+    
+    points = np.asarray(path_coords, dtype=np.float64)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        inner = points[first + 1:last]
+        dx, dy = end - start
+        length = math.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(inner[:, 0] - start[0], inner[:, 1] - start[1])
+        else:
+            distances = np.abs(dx * (inner[:, 1] - start[1]) - dy * (inner[:, 0] - start[0])) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_deg:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return [tuple(point) for point in points[keep].tolist()]
+
+
+def _fetch_car_routes(lats, lons, types, google_api_key=None):
+    """
+    Work out which legs are car trips and fetch all their driving routes concurrently.
+    Takes the stops' latitude, longitude and type arrays, in trip order.
+    Returns (leg_is_car, car_routes): a flag per leg, and {leg index: route coords or None}.
+    """
+    # Types are normalized in one vectorized pass; missing types are flights
+    types = pd.Series(types, dtype=object).fillna('flight').astype(str).str.lower().str.strip()
+    leg_is_car = types.isin(CAR_TYPES).tolist()[:-1]
+    
+    lats = lats.tolist()
+    lons = lons.tolist()
+    car_routes = {}
+    car_legs = []
+    for i, is_car in enumerate(leg_is_car):
+        if not is_car:
+            continue
+        # Endpoints this close (e.g. the same place on consecutive days) need no routing request;
+        # like a failed request, they are drawn with the straight-line fallback
+        if _haversine_km(lats[i], lons[i], lats[i + 1], lons[i + 1]) < MIN_ROUTE_DISTANCE_KM:
+            car_routes[i] = None
+        else:
+            car_legs.append(i)
+    if not car_legs:
+        return leg_is_car, car_routes
+    
+    # OSRM routes each run of consecutive car legs with a single multi-waypoint request
+    runs = []
+    for i in car_legs:
+        if (not google_api_key and runs and runs[-1][-1] == i - 1
+                and len(runs[-1]) < OSRM_MAX_LEGS_PER_REQUEST):
+            runs[-1].append(i)
+        else:
+            runs.append([i])
+    print(f"  Fetching {len(car_legs)} car route(s) in {len(runs)} request(s)...")
     
-    # Read CSV
-    df = pd.read_csv(csv_file)
+    def fetch(run):
+        waypoints = [[lats[i], lons[i]] for i in run] + [[lats[run[-1] + 1], lons[run[-1] + 1]]]
+        if google_api_key:
+            return [get_driving_route(waypoints[0], waypoints[1], google_api_key)]
+        return get_driving_route_legs(waypoints)
+    
+    with ThreadPoolExecutor(max_workers=min(ROUTING_MAX_WORKERS, len(runs))) as executor:
+        for run, routes in zip(runs, executor.map(fetch, runs)):
+            car_routes.update(zip(run, routes))
+    return leg_is_car, car_routes
+
+
+def _loads_json(content):
+    """Parse a JSON response body (bytes), using orjson's C parser when it is installed."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def _dumps_json(obj):
+    """Serialize to a JSON string, using orjson's C encoder when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+    return json.dumps(obj)
+
+
+def _stops_geojson(lats, lons, places, dates, colors):
+    """Build a single GeoJSON layer of circle markers, one Point feature per stop."""
+    import folium
+    features = [
+        {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [float(lon), float(lat)]},
+            'properties': {
+                'stop': idx + 1,
+                'place': str(place),
+                'date': date,
+                'color': PIN_COLORS[color]
+            }
+        }
+        for idx, (lat, lon, place, date, color) in enumerate(zip(lats, lons, places, dates, colors))
+    ]
+    return folium.GeoJson(
+        {'type': 'FeatureCollection', 'features': features},
+        marker=folium.CircleMarker(radius=8, color='black', weight=2, fill=True, fill_opacity=0.9),
+        style_function=lambda feature: {'fillColor': feature['properties']['color']},
+        tooltip=folium.GeoJsonTooltip(fields=['place', 'date'], labels=False),
+        popup=folium.GeoJsonPopup(fields=['stop', 'place', 'date'], aliases=['Stop', 'Place', 'Date'])
+    )
+
+
+def _load_and_prepare(csv_file, date_column, place_column, type_column, fast_io=False):
+    """
+    Read a trip CSV for the map builders: validate columns, parse dates and sort by date.
+    Returns (df, has_type_column); without a type column every leg is a flight.
+    """
+    # Only the date, place and type columns are used, so skip the rest while parsing
+    df = read_trip_csv(csv_file, fast_io, date_column=date_column,
+                       dtype={place_column: STRING_DTYPE, type_column: 'category'},
+                       usecols=[date_column, place_column, type_column])
     
     # Validate columns
-    if date_column not in df.columns or place_column not in df.columns:
+    if not set(df.columns) >= {date_column, place_column}:
+        # Show the file's full header, not just the columns that were read
         print(f"Error: CSV must have '{date_column}' and '{place_column}' columns")
-        print(f"Found columns: {', '.join(df.columns)}")
+        print(f"Found columns: {', '.join(pd.read_csv(csv_file, nrows=0).columns)}")
         sys.exit(1)
     
     # Check if type column exists
     has_type_column = type_column in df.columns
     if not has_type_column:
         print(f"Note: No '{type_column}' column found, using straight lines for all connections")
-        df[type_column] = 'flight'
+        df[type_column] = 'flight'  # Default to flight (straight line)
+    
+    # ISO dates are parsed by the CSV reader; parse here if it could not
+    # (ISO 8601 first, per-value format inference only for the rest)
+    if not pd.api.types.is_datetime64_any_dtype(df[date_column]):
+        df[date_column] = parse_trip_dates(df[date_column])
     
-    # Parse dates and sort by date
-    df[date_column] = pd.to_datetime(df[date_column], format='mixed')
+    # Sort by date
     df = df.sort_values(by=date_column).reset_index(drop=True)
+    return df, has_type_column
+
+
+def _valid_stops(df, date_column, place_column, type_column):
+    """
+    Select the geocoded stops with a mask, without copying the DataFrame.
+    Returns (lats, lons, places, dates, types) NumPy arrays, dates as 'YYYY-MM-DD' strings.
+    """
+    valid = df['latitude'].notna().to_numpy() & df['longitude'].notna().to_numpy()
     
-    print(f"\nProcessing {len(df)} locations...")
+    if not valid.any():
+        print("\nError: No valid locations found!")
+        sys.exit(1)
     
-    # Geocode places
-    df = geocode_places(df, place_column)
+    print(f"\n{valid.sum()} locations successfully geocoded")
     
-    # Remove rows without valid coordinates
-    df_valid = df.dropna(subset=['latitude', 'longitude'])
+    return (
+        df['latitude'].to_numpy()[valid],
+        df['longitude'].to_numpy()[valid],
+        df[place_column].to_numpy()[valid],
+        df[date_column].dt.strftime('%Y-%m-%d').to_numpy()[valid],
+        df[type_column].to_numpy()[valid]
+    )
+
+
+def create_animated_trip_map(csv_file, output_file='trip_map_animated.html', date_column='date', place_column='place', type_column='type',
+                             fast_io=False):
+    """Create an animated map with a single moving marker traveling along routes (AllTrails style)."""
+    df, has_type_column = _load_and_prepare(csv_file, date_column, place_column, type_column, fast_io)
     
-    if len(df_valid) == 0:
-        print("\nError: No valid locations found!")
-        sys.exit(1)
+    # Rendering libraries are imported only once the CSV is valid, so importing tripmap
+    # (e.g. for geocode_places) or failing on a bad CSV stays light
+    import folium
+    import polyline
     
-    print(f"\n{len(df_valid)} locations successfully geocoded")
+    print(f"\nProcessing {len(df)} locations...")
+    
+    # Geocode places
+    df = geocode_places(df, place_column, nominatim_domain=os.environ.get('NOMINATIM_DOMAIN'))
+    
+    # Keep only rows with valid coordinates, as column arrays
+    lat_arr, lon_arr, place_arr, date_arr, type_arr = _valid_stops(df, date_column, place_column, type_column)
     
     # Create map centered on the mean coordinates
-    center_lat = df_valid['latitude'].mean()
-    center_lon = df_valid['longitude'].mean()
+    center_lat = lat_arr.mean()
+    center_lon = lon_arr.mean()
     
     trip_map = folium.Map(location=[center_lat, center_lon], zoom_start=5)
+    # folium names the map's JavaScript variable after the element, so the animation can refer to it
+    map_var_name = trip_map.get_name()
+    # Collect markers and routes in layers that are attached to the map once
+    trip_markers = folium.FeatureGroup(name='Trip Points')
+    trip_routes = folium.FeatureGroup(name='Trip Routes')
     
     # Get routing information if needed
     google_api_key = os.environ.get('GOOGLE_MAPS_API_KEY')
@@ -168,33 +821,27 @@ def create_animated_trip_map(csv_file, output_file='trip_map_animated.html', dat
     
     print(f"\nDrawing static routes...")
     
-    # Store route data for animation
-    route_segments = []
-    all_coordinates = []
+    # Animation data, one entry per leg; paths ship as encoded polylines (a few bytes
+    # per point instead of two JSON floats) and are decoded in the browser
+    js_segments = []
+    
+    leg_is_car, car_routes = _fetch_car_routes(lat_arr, lon_arr, type_arr, google_api_key)
     
     # Add all routes as static lines (no animation on routes)
-    for i in range(len(df_valid) - 1):
-        start_row = df_valid.iloc[i]
-        end_row = df_valid.iloc[i + 1]
+    for i in range(len(lat_arr) - 1):
+        start_coords = [lat_arr[i], lon_arr[i]]
+        end_coords = [lat_arr[i + 1], lon_arr[i + 1]]
         
-        start_coords = [start_row['latitude'], start_row['longitude']]
-        end_coords = [end_row['latitude'], end_row['longitude']]
-        
-        trip_type = start_row.get(type_column, 'flight')
-        if pd.isna(trip_type):
-            trip_type = 'flight'
-        trip_type = str(trip_type).lower().strip()
-        
-        # Determine if this is a car trip
-        is_car = trip_type in ['car', 'drive', 'driving']
+        is_car = leg_is_car[i]
         
         # Get route coordinates
         if is_car:
-            print(f"  [{i+1}→{i+2}] Car route: {start_row[place_column]} → {end_row[place_column]}", end="")
-            route_coords = get_driving_route(start_coords, end_coords, google_api_key)
+            print(f"  [{i+1}→{i+2}] Car route: {place_arr[i]} → {place_arr[i + 1]}", end="")
+            route_coords = car_routes[i]
             if route_coords:
-                print(f" ✓ ({len(route_coords)} points)")
-                path_coords = route_coords
+                # Simplified once, for both the static line and the animation data
+                path_coords = simplify_path(route_coords)
+                print(f" ✓ ({len(route_coords)} points, {len(path_coords)} drawn)")
             else:
                 print()
                 path_coords = [start_coords, end_coords]
@@ -205,12 +852,10 @@ def create_animated_trip_map(csv_file, output_file='trip_map_animated.html', dat
                 color='green',
                 weight=4,
                 opacity=0.6,
-                popup=f"🚗 Drive: {start_row[place_column]} → {end_row[place_column]}"
-            ).add_to(trip_map)
-            
-            time.sleep(0.5)
+                popup=f"🚗 Drive: {place_arr[i]} → {place_arr[i + 1]}"
+            ).add_to(trip_routes)
         else:
-            print(f"  [{i+1}→{i+2}] Flight: {start_row[place_column]} → {end_row[place_column]}")
+            print(f"  [{i+1}→{i+2}] Flight: {place_arr[i]} → {place_arr[i + 1]}")
             path_coords = [start_coords, end_coords]
             
             # Add static route line
@@ -220,72 +865,35 @@ def create_animated_trip_map(csv_file, output_file='trip_map_animated.html', dat
                 weight=3,
                 opacity=0.6,
                 dash_array='10, 5',
-                popup=f"✈️ Flight: {start_row[place_column]} → {end_row[place_column]}"
-            ).add_to(trip_map)
+                popup=f"✈️ Flight: {place_arr[i]} → {place_arr[i + 1]}"
+            ).add_to(trip_routes)
         
-        # Store segment info for animation
-        route_segments.append({
-            'start_idx': i,
-            'end_idx': i + 1,
-            'coords': path_coords,
-            'is_car': is_car,
-            'start_place': start_row[place_column],
-            'end_place': end_row[place_column]
+        # Store segment info for animation, already in the shape the script reads
+        js_segments.append({
+            'path': polyline.encode(path_coords),
+            # Points advanced per frame, so every leg animates in about 100 frames
+            'stepSize': max(1, len(path_coords) // 100),
+            'iscar': is_car,
+            'startPlace': place_arr[i],
+            'endPlace': place_arr[i + 1]
         })
     
     print(f"\nAdding destination markers...")
     
-    # Add permanent markers for each location
-    for idx, row in df_valid.iterrows():
-        date_str = row[date_column].strftime('%Y-%m-%d')
-        marker_color = 'red' if idx == 0 else ('green' if idx == len(df_valid) - 1 else 'blue')
-        
-        folium.CircleMarker(
-            location=[row['latitude'], row['longitude']],
-            radius=8,
-            popup=f"<b>{row[place_column]}</b><br>{date_str}<br>Stop {idx+1} of {len(df_valid)}",
-            tooltip=f"{row[place_column]} ({date_str})",
-            color='black',
-            fillColor=marker_color,
-            fillOpacity=0.9,
-            weight=2
-        ).add_to(trip_map)
-    
-    # Prepare data for JavaScript animation
-    print(f"\nPreparing animation data...")
-    
-    # Build JavaScript arrays for animation
-    js_segments = []
-    for seg in route_segments:
-        coords_js = [[lat, lon] for lat, lon in seg['coords']]
-        js_segments.append({
-            'path': coords_js,
-            'iscar': seg['is_car'],
-            'startPlace': seg['start_place'],
-            'endPlace': seg['end_place']
-        })
+    # Add permanent markers for each location as one GeoJSON layer of circle markers
+    positions = np.arange(len(lat_arr))
+    color_arr = np.where(positions == 0, 'red', np.where(positions == len(lat_arr) - 1, 'green', 'blue'))
+    _stops_geojson(lat_arr, lon_arr, place_arr, date_arr, color_arr).add_to(trip_markers)
     
-    # Save the base map first
-    trip_map.save(output_file)
+    trip_routes.add_to(trip_map)
+    trip_markers.add_to(trip_map)
+    folium.LayerControl().add_to(trip_map)
     
-    # Now inject custom JavaScript for moving marker animation
+    # Add custom JavaScript for moving marker animation to the page before saving
     print(f"\nInjecting animation JavaScript...")
     
-    with open(output_file, 'r', encoding='utf-8') as f:
-        html_content = f.read()
-    
     # Convert route segments to JSON
-    js_segments_json = json.dumps(js_segments)
-    
-    # Find the map variable name from the HTML
-    import re
-    map_var_match = re.search(r'var (map_[a-f0-9]+) = L\.map\(', html_content)
-    if not map_var_match:
-        print("  Warning: Could not find map variable name, animation may not work")
-        map_var_name = "map"
-    else:
-        map_var_name = map_var_match.group(1)
-        print(f"  Found map variable: {map_var_name}")
+    js_segments_json = _dumps_json(js_segments)
     
     # Build animation script
     animation_script = f"""
@@ -300,6 +908,30 @@ def create_animated_trip_map(csv_file, output_file='trip_map_animated.html', dat
         var currentPointIndex = 0;
         var currentSegmentPath = [];
         
+        // Decode a Google encoded polyline (precision 5) into [[lat, lon], ...]
+        function decodePolyline(str) {{
+            var points = [];
+            var index = 0, lat = 0, lon = 0;
+            while (index < str.length) {{
+                for (var axis = 0; axis < 2; axis++) {{
+                    var result = 0, shift = 0, b;
+                    do {{
+                        b = str.charCodeAt(index++) - 63;
+                        result |= (b & 0x1f) << shift;
+                        shift += 5;
+                    }} while (b >= 0x20);
+                    var change = (result & 1) ? ~(result >> 1) : (result >> 1);
+                    if (axis === 0) {{
+                        lat += change;
+                    }} else {{
+                        lon += change;
+                    }}
+                }}
+                points.push([lat / 1e5, lon / 1e5]);
+            }}
+            return points;
+        }}
+        
         // Wait for map to be fully loaded
         setTimeout(function() {{
             if (typeof {map_var_name} !== 'undefined') {{
@@ -383,7 +1015,11 @@ def create_animated_trip_map(csv_file, output_file='trip_map_animated.html', dat
         
         function animateSegment() {{
             var segment = routeSegments[currentSegmentIndex];
-            currentSegmentPath = segment.path;
+            // Decode each segment once; replays reuse the decoded points
+            if (!segment.points) {{
+                segment.points = decodePolyline(segment.path);
+            }}
+            currentSegmentPath = segment.points;
             
             if (currentPointIndex === 0) {{
                 // Create marker at start of segment
@@ -401,8 +1037,8 @@ def create_animated_trip_map(csv_file, output_file='trip_map_animated.html', dat
                 }}).addTo({map_var_name});
             }}
             
-            // Animate through points
-            var stepSize = Math.max(1, Math.floor(currentSegmentPath.length / 100));
+            // Animate through points (step size is precomputed per segment)
+            var stepSize = segment.stepSize;
             
             function animateStep() {{
                 if (!isPlaying) {{
@@ -451,14 +1087,12 @@ def create_animated_trip_map(csv_file, output_file='trip_map_animated.html', dat
     # Replace placeholder with actual data
     animation_script = animation_script.replace('ROUTE_SEGMENTS_PLACEHOLDER', js_segments_json)
     
-    # Inject before </body>
-    html_content = html_content.replace('</body>', animation_script + '\n</body>')
-    
-    # Write back
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    # Rendered into the page body along with the map, so the HTML is written once.
+    # Element content is a Jinja template and encoded polylines can contain '{{', so keep it raw
+    trip_map.get_root().html.add_child(folium.Element('{% raw %}' + animation_script + '{% endraw %}'))
     
     # Save map
+    trip_map.save(output_file)
     print(f"\n✓ Animated map saved to: {output_file}")
     print(f"  Open this file in your browser to see the AllTrails-style animation!")
     print(f"  - All routes are visible (static, no animation)")
@@ -467,68 +1101,56 @@ def create_animated_trip_map(csv_file, output_file='trip_map_animated.html', dat
     print(f"  - Green routes = car, Blue routes = flights")
 
 
-def create_trip_map(csv_file, output_file='trip_map.html', date_column='date', place_column='place', type_column='type'):
+def create_trip_map(csv_file, output_file='trip_map.html', date_column='date', place_column='place', type_column='type',
+                    fast_io=False):
     """Create a basic interactive map with markers and timeline connections (no animation).
     
     Note: This is a simpler version without animation. For animated maps with play/pause controls,
     use create_animated_trip_map() instead (which is the default when running from command line).
     """
+    df, has_type_column = _load_and_prepare(csv_file, date_column, place_column, type_column, fast_io)
     
-    # Read CSV
-    df = pd.read_csv(csv_file)
-    
-    # Validate columns
-    if date_column not in df.columns or place_column not in df.columns:
-        print(f"Error: CSV must have '{date_column}' and '{place_column}' columns")
-        print(f"Found columns: {', '.join(df.columns)}")
-        sys.exit(1)
-    
-    # Check if type column exists
-    has_type_column = type_column in df.columns
-    if not has_type_column:
-        print(f"Note: No '{type_column}' column found, using straight lines for all connections")
-        df[type_column] = 'flight'  # Default to flight (straight line)
-    
-    # Parse dates and sort by date
-    df[date_column] = pd.to_datetime(df[date_column], format='mixed')
-    df = df.sort_values(by=date_column).reset_index(drop=True)
+    # Imported only once the CSV is valid (see create_animated_trip_map)
+    import folium
     
     print(f"\nProcessing {len(df)} locations...")
     
     # Geocode places
-    df = geocode_places(df, place_column)
+    df = geocode_places(df, place_column, nominatim_domain=os.environ.get('NOMINATIM_DOMAIN'))
     
-    # Remove rows without valid coordinates
-    df_valid = df.dropna(subset=['latitude', 'longitude'])
-    
-    if len(df_valid) == 0:
-        print("\nError: No valid locations found!")
-        sys.exit(1)
-    
-    print(f"\n{len(df_valid)} locations successfully geocoded")
+    # Keep only rows with valid coordinates, as column arrays
+    lat_arr, lon_arr, place_arr, date_arr, type_arr = _valid_stops(df, date_column, place_column, type_column)
     
     # Create map centered on the mean coordinates
-    center_lat = df_valid['latitude'].mean()
-    center_lon = df_valid['longitude'].mean()
+    center_lat = lat_arr.mean()
+    center_lon = lon_arr.mean()
     
     trip_map = folium.Map(location=[center_lat, center_lon], zoom_start=5)
+    # Collect markers and routes in layers that are attached to the map once
+    trip_markers = folium.FeatureGroup(name='Trip Points')
+    trip_routes = folium.FeatureGroup(name='Trip Routes')
     
     # Add markers for each location
-    for idx, row in df_valid.iterrows():
-        date_str = row[date_column].strftime('%Y-%m-%d')
-        
-        folium.Marker(
-            location=[row['latitude'], row['longitude']],
-            popup=f"<b>{row[place_column]}</b><br>{date_str}",
-            tooltip=f"{row[place_column]} ({date_str})",
-            icon=folium.Icon(color='red' if idx == 0 else ('green' if idx == len(df_valid) - 1 else 'blue'))
-        ).add_to(trip_map)
+    positions = np.arange(len(lat_arr))
+    color_arr = np.where(positions == 0, 'red', np.where(positions == len(lat_arr) - 1, 'green', 'blue'))
+    
+    if len(lat_arr) > GEOJSON_MARKER_THRESHOLD:
+        # Large trips: one GeoJSON layer for all stops instead of a Leaflet marker each
+        print(f"  {len(lat_arr)} locations, drawing stops as a single GeoJSON layer")
+        _stops_geojson(lat_arr, lon_arr, place_arr, date_arr, color_arr).add_to(trip_markers)
+    else:
+        # One marker per location: a coloured pin with the stop number drawn inside it
+        trip_map.get_root().header.add_child(folium.Element(PIN_CSS))
+        pin_html = [f'<div class="trip-pin trip-pin-{color}"><span>{idx+1}</span></div>'
+                    for idx, color in enumerate(color_arr)]
         
-        # Add date label
-        folium.Marker(
-            location=[row['latitude'], row['longitude']],
-            icon=folium.DivIcon(html=f'<div style="font-size: 10pt; color: black; font-weight: bold;">{idx+1}</div>')
-        ).add_to(trip_map)
+        for idx in range(len(lat_arr)):
+            folium.Marker(
+                location=[lat_arr[idx], lon_arr[idx]],
+                popup=f"<b>{place_arr[idx]}</b><br>{date_arr[idx]}",
+                tooltip=f"{place_arr[idx]} ({date_arr[idx]})",
+                icon=folium.DivIcon(html=pin_html[idx], icon_size=(26, 26), icon_anchor=(13, 31))
+            ).add_to(trip_markers)
     
     # Connect locations with lines based on type (chronological order)
     print(f"\nDrawing route connections...")
@@ -536,24 +1158,17 @@ def create_trip_map(csv_file, output_file='trip_map.html', date_column='date', p
     if not google_api_key and has_type_column:
         print("  Note: GOOGLE_MAPS_API_KEY not set, using free OSRM routing for car trips")
     
-    for i in range(len(df_valid) - 1):
-        start_row = df_valid.iloc[i]
-        end_row = df_valid.iloc[i + 1]
-        
-        start_coords = [start_row['latitude'], start_row['longitude']]
-        end_coords = [end_row['latitude'], end_row['longitude']]
-        
-        trip_type = start_row.get(type_column, 'flight')
-        if pd.isna(trip_type):
-            trip_type = 'flight'
-        trip_type = str(trip_type).lower().strip()
+    leg_is_car, car_routes = _fetch_car_routes(lat_arr, lon_arr, type_arr, google_api_key)
+    
+    for i in range(len(lat_arr) - 1):
+        start_coords = [lat_arr[i], lon_arr[i]]
+        end_coords = [lat_arr[i + 1], lon_arr[i + 1]]
         
-        # Determine if this is a car trip
-        is_car = trip_type in ['car', 'drive', 'driving']
+        is_car = leg_is_car[i]
         
         if is_car:
-            print(f"  [{i+1}→{i+2}] Car route: {start_row[place_column]} → {end_row[place_column]}", end="")
-            route_coords = get_driving_route(start_coords, end_coords, google_api_key)
+            print(f"  [{i+1}→{i+2}] Car route: {place_arr[i]} → {place_arr[i + 1]}", end="")
+            route_coords = car_routes[i]
             
             if route_coords:
                 print(f" ✓ ({len(route_coords)} points)")
@@ -562,8 +1177,8 @@ def create_trip_map(csv_file, output_file='trip_map.html', date_column='date', p
                     color='green',
                     weight=3,
                     opacity=0.8,
-                    popup=f"🚗 Drive: {start_row[place_column]} → {end_row[place_column]}"
-                ).add_to(trip_map)
+                    popup=f"🚗 Drive: {place_arr[i]} → {place_arr[i + 1]}"
+                ).add_to(trip_routes)
             else:
                 # Fallback to straight line
                 print()
@@ -573,21 +1188,23 @@ def create_trip_map(csv_file, output_file='trip_map.html', date_column='date', p
                     weight=3,
                     opacity=0.6,
                     dash_array='5, 5',
-                    popup=f"🚗 Drive: {start_row[place_column]} → {end_row[place_column]}"
-                ).add_to(trip_map)
-            
-            time.sleep(0.5)  # Rate limiting
+                    popup=f"🚗 Drive: {place_arr[i]} → {place_arr[i + 1]}"
+                ).add_to(trip_routes)
         else:
             # Flight or default - straight line
-            print(f"  [{i+1}→{i+2}] Flight: {start_row[place_column]} → {end_row[place_column]}")
+            print(f"  [{i+1}→{i+2}] Flight: {place_arr[i]} → {place_arr[i + 1]}")
             folium.PolyLine(
                 [start_coords, end_coords],
                 color='blue',
                 weight=2,
                 opacity=0.7,
                 dash_array='10, 5',
-                popup=f"✈️ Flight: {start_row[place_column]} → {end_row[place_column]}"
-            ).add_to(trip_map)
+                popup=f"✈️ Flight: {place_arr[i]} → {place_arr[i + 1]}"
+            ).add_to(trip_routes)
+    
+    trip_routes.add_to(trip_map)
+    trip_markers.add_to(trip_map)
+    folium.LayerControl().add_to(trip_map)
     
     # Save map
     trip_map.save(output_file)
@@ -616,14 +1233,19 @@ The generated map includes:
 For car routes with Google Maps:
   export GOOGLE_MAPS_API_KEY='your-api-key'
   (Otherwise uses free OSRM routing)
+
+For geocoding with a self-hosted Nominatim server (faster with aiohttp installed):
+  export NOMINATIM_DOMAIN='nominatim.example.org'
         """
     )
     
     parser.add_argument('csv_file', help='Path to CSV file with trip data')
     parser.add_argument('output_file', nargs='?', default='trip_map.html',
                         help='Output HTML file (default: trip_map.html)')
+    parser.add_argument('--fast-io', action='store_true',
+                        help='Parse the CSV with PyArrow (requires pyarrow)')
     
     args = parser.parse_args()
     
     # Create the map with animation
-    create_animated_trip_map(args.csv_file, args.output_file)
+    create_animated_trip_map(args.csv_file, args.output_file, fast_io=args.fast_io)